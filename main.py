@@ -1,18 +1,23 @@
-import pyodbc
+import time
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 import streamlit as st
 from streamlit_autorefresh import st_autorefresh
-from datetime import date
-import locale
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from urllib.parse import quote_plus
+from sqlalchemy import create_engine
 
-# Define o locale para pt_BR para formatação de moeda
-try:
-    locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
-except:
-    locale.setlocale(locale.LC_ALL, '')
+# Largura da tabela de vendedores, em pixels
+LARGURA_TABELA = 800
+
+# Intervalo de atualização do painel, em segundos
+INTERVALO_ATUALIZACAO = 10
 
 @st.cache_resource
-def get_conexao():
+def get_engine():
     # Acessando as credenciais de forma segura através dos segredos do Streamlit
     conexao_dados = (
         "Driver=" + st.secrets["conexao_banco_dados"]["Driver"] + ";"
@@ -21,57 +26,135 @@ def get_conexao():
         "UID=" + st.secrets["conexao_banco_dados"]["UID"] + ";"
         "PWD=" + st.secrets["conexao_banco_dados"]["PWD"]
     )
-    return pyodbc.connect(conexao_dados)
+    # Pool compartilhado entre as sessões: cada consulta pega a sua própria conexão,
+    # já que uma conexão pyodbc não pode ser usada por várias threads ao mesmo tempo.
+    # O painel só lê, então autocommit evita transações implícitas abertas no pool
+    return create_engine(
+        "mssql+pyodbc:///?odbc_connect=" + quote_plus(conexao_dados),
+        pool_pre_ping=True,
+        connect_args={"autocommit": True},
+    )
+
+# Troca os separadores do formato en_US pelos do pt_BR, sem depender do locale do processo
+_SEPARADORES_BR = str.maketrans({',': '.', '.': ','})
+
+# Nomes dos dias da semana indexados por date.weekday(), antes vindos do locale pt_BR
+DIAS_SEMANA = ('segunda-feira', 'terça-feira', 'quarta-feira', 'quinta-feira', 'sexta-feira', 'sábado', 'domingo')
 
 def formatar_moeda(valor):
+    return "R$ " + format(valor, ',.2f').translate(_SEPARADORES_BR)
+
+# Tipo Arrow de cada type_code do pyodbc; tipos fora do mapa são inferidos dos valores
+_TIPOS_ARROW = {
+    str: pa.string(),
+    int: pa.int64(),
+    float: pa.float64(),
+    bool: pa.bool_(),
+    datetime: pa.timestamp('us'),
+    date: pa.date32(),
+}
+
+def tipo_arrow(descricao):
+    # descricao segue o cursor.description: (nome, type_code, display_size, internal_size, precisão, escala, null_ok)
+    _, tipo, _, _, precisao, escala, _ = descricao
+    if tipo is Decimal:
+        return pa.decimal128(precisao, escala)
+    return _TIPOS_ARROW.get(tipo)
+
+def ler_resultado(cursor):
+    # Monta o DataFrame do result set atual com pyarrow. As linhas ainda vêm do
+    # fetchall do pyodbc, mas os tipos saem do cursor.description, então um
+    # result set vazio mantém os tipos das colunas em vez de virar null
+    linhas = cursor.fetchall()
+    valores = list(zip(*linhas)) or [()] * len(cursor.description)
+    colunas = []
+    for descricao, coluna in zip(cursor.description, valores):
+        array = pa.array(coluna, type=tipo_arrow(descricao))
+        # Valores decimais do SQL Server viram float, como o coerce_float do pd.read_sql
+        if pa.types.is_decimal(array.type):
+            array = array.cast(pa.float64())
+        colunas.append(array)
+    tabela = pa.table(colunas, names=[descricao[0] for descricao in cursor.description])
+    return tabela.to_pandas(types_mapper=pd.ArrowDtype)
+
+# Sem ttl: a chave inclui a janela de relógio (time.time() // INTERVALO_ATUALIZACAO), igual
+# para todas as sessões, então cada janela faz uma leitura e nenhuma sessão vê dado de janela anterior
+@st.cache_data(max_entries=8)
+def carregar_movimento_hoje(hoje, janela):
+    # Vendas e devoluções num único lote com dois result sets, em vez de duas consultas.
+    # O pool_pre_ping do engine ainda faz um SELECT 1 ao pegar a conexão do pool.
+    # A soma por vendedor é feita no SQL Server, então só trafega o resumo.
+    # Intervalo [dia, dia + 1) permite o uso de índice nas colunas de emissão
+    query = """
+        SET NOCOUNT ON;
+
+        SELECT VENDEDOR AS Vendedor, SUM(ValorNF) AS Receita
+        FROM dbo.v_faturamento_produto
+        WHERE Emissao >= ? AND Emissao < ?
+        GROUP BY VENDEDOR;
+
+        SELECT NOME_VENDEDOR AS Vendedor, SUM(VALOR_TOTAL) AS [Devolução]
+        FROM dbo.v_devolucoes
+        WHERE EMISSAO_NFD >= ? AND EMISSAO_NFD < ?
+        GROUP BY NOME_VENDEDOR;
+    """
+    amanha = hoje + timedelta(days=1)
+    conexao = get_engine().raw_connection()
     try:
-        return locale.currency(valor, grouping=True, symbol=True)
-    except:
-        return f"R$ {valor:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-
-@st.cache_data(ttl=10)
-def carregar_dados_hoje(hoje_str):
-    with get_conexao() as conexao:
-        query = f"""
-            SELECT Emissao, VENDEDOR, ValorNF
-            FROM dbo.v_faturamento_produto
-            WHERE CAST(Emissao AS DATE) = '{hoje_str}'
-        """
-        return pd.read_sql(query, conexao)
-
-@st.cache_data(ttl=10)
-def carregar_devolucoes_hoje(hoje_str):
-    with get_conexao() as conexao:
-        query = f"""
-            SELECT 
-                [QUANTIDADE],
-                [VALOR_TOTAL],
-                [NF],
-                [EMISSAO_NFD],
-                [COD_VENDEDOR],
-                [NOME_VENDEDOR]
-            FROM dbo.v_devolucoes
-            WHERE CAST(EMISSAO_NFD AS DATE) = '{hoje_str}'
-        """
-        df = pd.read_sql(query, conexao)
-    return df
+        cursor = conexao.cursor()
+        cursor.execute(query, hoje, amanha, hoje, amanha)
+        df_vendas = ler_resultado(cursor)
+        cursor.nextset()
+        df_devolucoes = ler_resultado(cursor)
+    finally:
+        # Devolve a conexão ao pool
+        conexao.close()
+    return df_vendas, df_devolucoes
+
+def assinatura(df):
+    # Hash barato do conteúdo: os resumos têm uma linha por vendedor
+    return len(df), int(pd.util.hash_pandas_object(df, index=False).sum())
+
+@st.cache_data(max_entries=8)
+def montar_tabela_vendedor(assinatura_vendas, assinatura_devolucoes, _df_vendas, _df_devolucoes):
+    # Os DataFrames com "_" não entram na chave do cache; só as assinaturas são hasheadas.
+    # Os dois resumos já chegam com a coluna Vendedor: empilha e soma no Arrow (C++),
+    # sem merge nem groupby do pandas; a coluna ausente em cada lado vira nula
+    tabela = pa.concat_tables(
+        [pa.Table.from_pandas(_df_vendas, preserve_index=False),
+         pa.Table.from_pandas(_df_devolucoes, preserve_index=False)],
+        promote_options='default'
+    )
+    agregado = tabela.group_by('Vendedor', use_threads=False).aggregate(
+        [('Receita', 'sum'), ('Devolução', 'sum')]
+    )
+    receita = pc.fill_null(agregado['Receita_sum'], 0.0)
+    devolucao = pc.fill_null(agregado['Devolução_sum'], 0.0)
+    df_vendedor = pa.table({
+        'Vendedor': agregado['Vendedor'],
+        'Receita': receita,
+        'Devolução': devolucao,
+        'Faturamento': pc.subtract(receita, devolucao),
+    }).to_pandas(types_mapper=pd.ArrowDtype)
+    return df_vendedor.sort_values(by='Faturamento', ascending=False)
 
 def main():
     st.set_page_config(page_title="Informações de Faturamento do Dia", layout="wide")
     hoje = date.today()
-    hoje_str = hoje.strftime('%Y-%m-%d') # Formato para a query SQL
 
-    st.title(f"Informações de Faturamento do Dia ({hoje.strftime('%d/%m/%Y')} - {hoje.strftime('%A')})")
+    st.title(f"Informações de Faturamento do Dia ({hoje.strftime('%d/%m/%Y')} - {DIAS_SEMANA[hoje.weekday()]})")
     
-    st_autorefresh(interval=10000, key="datarefresh")
+    # O autorefresh só dispara o rerun; a chave do cache vem do relógio
+    st_autorefresh(interval=INTERVALO_ATUALIZACAO * 1000, key="datarefresh")
 
     # --- Faturamento e Devoluções do dia ---
-    # Agora chamamos as funções otimizadas, passando a data como argumento
-    df_vendas = carregar_dados_hoje(hoje_str)
-    df_devolucoes = carregar_devolucoes_hoje(hoje_str)
+    # Leitura em cache pela data e pela janela de 10 segundos, a mesma para todas as sessões
+    janela = int(time.time() // INTERVALO_ATUALIZACAO)
+    df_vendas, df_devolucoes = carregar_movimento_hoje(hoje, janela)
 
-    total_vendas = df_vendas['ValorNF'].sum()
-    total_devolucoes = df_devolucoes['VALOR_TOTAL'].sum()
+    # Redução direto no ndarray, sem o caminho nullable do Series.sum
+    total_vendas = df_vendas['Receita'].to_numpy(dtype=np.float64, na_value=0.0).sum()
+    total_devolucoes = df_devolucoes['Devolução'].to_numpy(dtype=np.float64, na_value=0.0).sum()
     faturamento_liquido = total_vendas - total_devolucoes
 
     # --- Cartões no topo ---
@@ -81,51 +164,23 @@ def main():
     col3.metric("Faturamento Líquido", formatar_moeda(faturamento_liquido))
 
     # --- Receita, Devolução e Faturamento por Vendedor ---
-    vendas_vendedor = (
-        df_vendas.groupby('VENDEDOR', as_index=False)['ValorNF']
-        .sum()
-        .rename(columns={'ValorNF': 'Receita'})
-    )
-    devolucao_vendedor = (
-        df_devolucoes.groupby('NOME_VENDEDOR', as_index=False)['VALOR_TOTAL']
-        .sum()
-        .rename(columns={'VALOR_TOTAL': 'Devolução'})
+    tabela_vendedor = montar_tabela_vendedor(
+        assinatura(df_vendas), assinatura(df_devolucoes), df_vendas, df_devolucoes
     )
 
-    df_vendedor = pd.merge(
-        vendas_vendedor, devolucao_vendedor,
-        left_on='VENDEDOR', right_on='NOME_VENDEDOR', how='outer'
-    ).fillna(0)
-    df_vendedor['Faturamento'] = df_vendedor['Receita'] - df_vendedor['Devolução']
-    df_vendedor = df_vendedor.sort_values(by='Faturamento', ascending=False)
-
-    # Formata as colunas de moeda
-    for col in ['Receita', 'Devolução', 'Faturamento']:
-        df_vendedor[col] = df_vendedor[col].apply(formatar_moeda)
-
-    # Seleciona o nome do vendedor disponível
-    if 'VENDEDOR' in df_vendedor.columns:
-        tabela_vendedor = df_vendedor[['VENDEDOR', 'Receita', 'Devolução', 'Faturamento']].rename(
-            columns={'VENDEDOR': 'Vendedor'}
-        )
-    elif 'NOME_VENDEDOR' in df_vendedor.columns:
-        tabela_vendedor = df_vendedor[['NOME_VENDEDOR', 'Receita', 'Devolução', 'Faturamento']].rename(
-            columns={'NOME_VENDEDOR': 'Vendedor'}
-        )
-    else:
-        tabela_vendedor = df_vendedor[['Receita', 'Devolução', 'Faturamento']]
-
-    # --- NOVO TRECHO DE CÓDIGO ---
-    # Coloca tanto o subtítulo quanto a tabela dentro da coluna central
-    col_vazia_esq, col_tabela, col_vazia_dir = st.columns([1, 2, 1])
-
-    with col_tabela:
-        st.subheader("Receita, Devolução e Faturamento por Vendedor")
-        st.dataframe(
-            tabela_vendedor.style.set_properties(**{'width': 'auto'}),
-            use_container_width=True
-        )
-# --- Fim do novo trecho ---
+    # Largura fixa na própria tabela, sem colunas vazias nas laterais só para centralizar
+    st.subheader("Receita, Devolução e Faturamento por Vendedor")
+    # Sem Styler: a largura vem do column_config e não há CSS gerado a cada refresh.
+    # As colunas continuam numéricas; o navegador formata e permite reordenar por valor
+    colunas_moeda = ['Receita', 'Devolução', 'Faturamento']
+    st.dataframe(
+        tabela_vendedor,
+        use_container_width=False,
+        width=LARGURA_TABELA,
+        column_config={
+            col: st.column_config.NumberColumn(format='R$ %.2f', width='small') for col in colunas_moeda
+        }
+    )
 
 if __name__ == "__main__":
     main()